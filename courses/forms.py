@@ -1,11 +1,17 @@
+import re
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from .models import Enrollment, AssignmentSubmission, StudentProfile, Course
 from .models import Course
 
 User = get_user_model()
 
+# shape of the placeholder rolls ("ROLL00042") handed out by courses.signals
+PLACEHOLDER_ROLL_RE = re.compile(r'ROLL\d{5,}', re.IGNORECASE)
+
 class CourseForm(forms.ModelForm):
     class Meta:
         model = Course
@@ -25,6 +31,19 @@ class RegistrationForm(UserCreationForm):
         model = User
         fields = ('username', 'email', 'password1', 'password2', 'is_instructor', 'roll_number')
 
+    def clean_roll_number(self):
+        roll = self.cleaned_data.get('roll_number', '').strip()
+        # instructors get no StudentProfile, so their roll number is ignored
+        if not roll or self.cleaned_data.get('is_instructor'):
+            return roll
+        # the signal assigns ROLL<pk> placeholders; a typed one could collide with a later user's
+        if PLACEHOLDER_ROLL_RE.fullmatch(roll):
+            raise forms.ValidationError('Roll numbers of the form ROLL00001 are reserved; please enter your own.')
+        # roll numbers are unique; reject duplicates here rather than fail the INSERT in save()
+        if StudentProfile.objects.filter(roll_number=roll).exists():
+            raise forms.ValidationError('This roll number is already registered.')
+        return roll
+
     def save(self, commit=True):
         user = super().save(commit=False)
         user.email = self.cleaned_data['email']
@@ -32,15 +51,20 @@ class RegistrationForm(UserCreationForm):
             # mark as staff (instructor)
             user.is_staff = True
         if commit:
-            user.save()
-            # if roll_number provided and user is student, create StudentProfile
-            if not user.is_staff and self.cleaned_data.get('roll_number'):
-                StudentProfile.objects.get_or_create(user=user, defaults={'roll_number': self.cleaned_data['roll_number']})
+            roll_number = self.cleaned_data.get('roll_number')
+            with transaction.atomic():
+                # if roll_number provided and user is student, create StudentProfile here and
+                # tell the post_save signal not to create its placeholder one
+                if not user.is_staff and roll_number:
+                    user._skip_profile = True
+                user.save()
+                if getattr(user, '_skip_profile', False):
+                    StudentProfile.objects.create(user=user, roll_number=roll_number)
         return user
 
 
 class EnrollmentForm(forms.Form):
-    roll_number = forms.CharField(max_length=50, label='Student Roll Number')
+    roll_number = forms.CharField(label='Student Roll Number(s)', help_text='Separate multiple roll numbers with commas')
     course = forms.ModelChoiceField(queryset=Course.objects.none())
 
     def __init__(self, *args, **kwargs):
@@ -48,6 +72,13 @@ class EnrollmentForm(forms.Form):
         # default to all courses
         self.fields['course'].queryset = Course.objects.all()
 
+    def clean_roll_number(self):
+        # returns a de-duplicated list of roll numbers, preserving input order
+        rolls = [r.strip() for r in self.cleaned_data['roll_number'].split(',') if r.strip()]
+        if not rolls:
+            raise forms.ValidationError('Enter at least one roll number.')
+        return list(dict.fromkeys(rolls))
+
            
 
 class AssignmentSubmissionForm(forms.ModelForm):
@@ -70,12 +101,11 @@ class AssignmentSubmissionForm(forms.ModelForm):
                 # instructors can choose courses they teach (helpful for testing)
                 self.fields['course'].queryset = Course.objects.filter(instructor=user)
             else:
-                try:
-                    profile = user.studentprofile
-                except Exception:
-                    profile = None
+                # reverse one-to-one raises RelatedObjectDoesNotExist (an AttributeError) when missing
+                profile = getattr(user, 'studentprofile', None)
                 if profile:
-                    course_ids = profile.enrollments.filter(active=True).values_list('course_id', flat=True)
-                    if course_ids:
-                        self.fields['course'].queryset = Course.objects.filter(id__in=course_ids)
+                    # single JOIN; unique_together(student, course) means no duplicate rows
+                    self.fields['course'].queryset = Course.objects.filter(
+                        enrollments__student=profile, enrollments__active=True
+                    )
 
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-15 20:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_alter_course_options_alter_course_department'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignmentsubmission',
+            index=models.Index(fields=['course', '-submitted_at'], name='courses_ass_course__b19df4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentsubmission',
+            index=models.Index(fields=['student', '-submitted_at'], name='courses_ass_student_b37ed6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['department'], name='courses_cou_departm_9688c2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', 'active'], name='courses_enr_student_9c2476_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', 'active'], name='courses_enr_course__34f871_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-15 20:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_add_hot_column_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='assignmentsubmission',
+            name='courses_ass_course__b19df4_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='assignmentsubmission',
+            name='courses_ass_student_b37ed6_idx',
+        ),
+        migrations.AddIndex(
+            model_name='assignmentsubmission',
+            index=models.Index(fields=['-submitted_at', '-id'], name='courses_ass_submitt_de3b56_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentsubmission',
+            index=models.Index(fields=['course', '-submitted_at', '-id'], name='courses_ass_course__473050_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentsubmission',
+            index=models.Index(fields=['student', '-submitted_at', '-id'], name='courses_ass_student_553295_idx'),
+        ),
+    ]
@@ -26,9 +26,21 @@ class Course(models.Model):
     description = models.TextField(blank=True)
     department = models.CharField(max_length=50, choices=DEPARTMENTS, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['department']),
+        ]
+
     def __str__(self):
         return self.title
 
+    @property
+    def department_name(self):
+        # dict lookup instead of get_department_display()'s scan of the choices
+        return DEPARTMENT_MAP.get(self.department, '')
+
+
+DEPARTMENT_MAP = dict(Course.DEPARTMENTS)
 
 
 class StudentProfile(models.Model):
@@ -51,6 +63,10 @@ class Enrollment(models.Model):
     class Meta:
         unique_together = ('student', 'course')
         ordering = ['-enrolled_on']
+        indexes = [
+            models.Index(fields=['student', 'active']),
+            models.Index(fields=['course', 'active']),
+        ]
 
     def __str__(self):
         return f"{self.student} → {self.course}"
@@ -75,6 +91,12 @@ class AssignmentSubmission(models.Model):
 
     class Meta:
         ordering = ['-submitted_at']
+        # every index ends in (-submitted_at, -id) to match the keyset order of the submissions list
+        indexes = [
+            models.Index(fields=['-submitted_at', '-id']),
+            models.Index(fields=['course', '-submitted_at', '-id']),
+            models.Index(fields=['student', '-submitted_at', '-id']),
+        ]
 
     def __str__(self):
         return f"Submission {self.pk} by {self.student} for {self.course}"
@@ -1,99 +1,203 @@
 # courses/signals.py
 import logging
-from django.db.models.signals import post_save
+import threading
+from django.db import connection, transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 from django.core.mail import send_mail, EmailMultiAlternatives
+from django.template.loader import get_template
 from django.contrib.auth import get_user_model
-from .models import StudentProfile, AssignmentSubmission
+from django.core.cache import cache
+from .models import Course, StudentProfile, AssignmentSubmission
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+# HTML bodies are compiled once per process; rendering autoescapes user-supplied values
+_WELCOME_TPL = get_template('emails/welcome.html')
+_GRADED_TPL = get_template('emails/graded.html')
+
+
+def _email_disabled():
+    """
+    True when no real mail can go out (dummy backend, or DEBUG without an SMTP host),
+    so the handlers can skip building and queueing messages altogether.
+    """
+    backend = getattr(settings, 'EMAIL_BACKEND', '') or ''
+    if backend.endswith('dummy.EmailBackend'):
+        return True
+    return settings.DEBUG and not getattr(settings, 'EMAIL_HOST', '')
+
+
+def _run_in_background(func, *args):
+    """
+    Run func(*args) in a daemon thread so SMTP latency stays off the request path.
+    """
+    def target():
+        try:
+            func(*args)
+        except Exception:
+            # a dying daemon thread only prints to stderr; route the failure through our logger
+            logger.exception("Background task %s%r failed", func.__name__, args)
+        finally:
+            # the thread opened its own DB connection; don't leak it
+            connection.close()
+
+    threading.Thread(target=target, daemon=True).start()
+
+
+def _enqueue(func, *args):
+    """
+    Schedule func(*args) to run in the background once the current transaction commits,
+    so the worker never sees (or mails about) rows that were rolled back.
+    """
+    transaction.on_commit(lambda: _run_in_background(func, *args))
+
+
+def queue_graded_email(submission_id):
+    """
+    Queue the graded notification; for callers that bypass post_save (e.g. QuerySet.update()).
+    """
+    if _email_disabled():
+        return
+    _enqueue(send_graded_email, submission_id)
+
+
+def send_welcome_email(user_id):
+    """
+    Send the welcome email to a newly registered student.
+    """
+    instance = User.objects.filter(pk=user_id).first()
+    if instance is None:
+        return
+
+    # prepare email details
+    recipient = instance.email
+    if not recipient:
+        logger.info("New user created but no email provided; skipping welcome email for user %s", instance)
+        return
+
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', None) or 'no-reply@localhost'
+
+    subject = 'Welcome to StudentCourses'
+    plain_message = (
+        f'Hi {instance.get_full_name() or instance.username},\n\n'
+        'Welcome to StudentCourses!\n\n'
+        'Your student account has been created. You can now log in and enroll in courses.\n\n'
+        'Regards,\nStudentCourses Team'
+    )
+
+    # Optional HTML message (makes email look nicer in inbox)
+    html_message = _WELCOME_TPL.render({'user': instance})
+
+    try:
+        # Use EmailMultiAlternatives so we can provide both plain and html
+        msg = EmailMultiAlternatives(subject, plain_message, from_email, [recipient])
+        msg.attach_alternative(html_message, "text/html")
+        # Note: keep fail_silently=True in production-like settings to avoid breaking signup flow
+        msg.send(fail_silently=True)
+        logger.info("Sent welcome email to %s", recipient)
+    except Exception as exc:
+        # Log exception; do not re-raise so registration flow stays intact
+        logger.exception("Failed to send welcome email to %s: %s", recipient, exc)
+
+
+def send_graded_email(submission_id):
+    """
+    Notify the student that their submission has been graded.
+    """
+    instance = (
+        AssignmentSubmission.objects.select_related('student__user', 'course')
+        .filter(pk=submission_id)
+        .first()
+    )
+    if instance is None:
+        return
+
+    recipient = getattr(instance.student.user, 'email', None)
+    if not recipient:
+        logger.info("Submission graded but student has no email: submission id %s", instance.pk)
+        return
+
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', None) or 'no-reply@localhost'
+
+    subject = f'Your assignment for {instance.course.title} has been graded'
+    plain_message = (
+        f'Hello {instance.student.user.get_full_name() or instance.student.user.username},\n\n'
+        f'Your submission for the course \"{instance.course.title}\" was graded.\n\n'
+        f'Grade: {instance.grade}\n\n'
+        f'Feedback:\n{instance.feedback or "No feedback provided."}\n\n'
+        'Regards,\nStudentCourses'
+    )
+
+    html_message = _GRADED_TPL.render({'submission': instance})
+
+    try:
+        msg = EmailMultiAlternatives(subject, plain_message, from_email, [recipient])
+        msg.attach_alternative(html_message, "text/html")
+        msg.send(fail_silently=True)
+        logger.info("Sent graded-notification to %s for submission %s", recipient, instance.pk)
+    except Exception as exc:
+        logger.exception("Failed to send graded-notification to %s for submission %s: %s", recipient, instance.pk, exc)
+
 
 @receiver(post_save, sender=User)
 def create_student_profile_on_user_create(sender, instance, created, **kwargs):
     """
     Create a StudentProfile automatically for regular (non-staff) users if not present.
-    If the user was created as instructor (is_staff=True) we do not create a StudentProfile.
-    Also sends a welcome email to the user's email (if provided).
+    If the user was created as instructor (is_staff=True) we do not create a StudentProfile,
+    nor when the caller set instance._skip_profile because it creates the profile itself.
+    Also queues a welcome email to the user's email (if provided), sent after commit in the background.
     """
     if created and not instance.is_staff:
-        # create with placeholder roll if not already existing (unique roll required)
-        default_roll = f"ROLL{instance.pk:05d}"
-        StudentProfile.objects.get_or_create(user=instance, defaults={'roll_number': default_roll})
-
-        # prepare email details
-        recipient = instance.email
-        if not recipient:
-            logger.info("New user created but no email provided; skipping welcome email for user %s", instance)
-            return
-
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', None) or 'no-reply@localhost'
-
-        subject = 'Welcome to StudentCourses'
-        plain_message = (
-            f'Hi {instance.get_full_name() or instance.username},\n\n'
-            'Welcome to StudentCourses!\n\n'
-            'Your student account has been created. You can now log in and enroll in courses.\n\n'
-            'Regards,\nStudentCourses Team'
-        )
+        if not getattr(instance, '_skip_profile', False):
+            # create with placeholder roll if not already existing (unique roll required)
+            default_roll = f"ROLL{instance.pk:05d}"
+            StudentProfile.objects.get_or_create(user=instance, defaults={'roll_number': default_roll})
 
-        # Optional HTML message (makes email look nicer in inbox)
-        html_message = f"""
-        <p>Hi <strong>{instance.get_full_name() or instance.username}</strong>,</p>
-        <p>Welcome to <strong>StudentCourses</strong>!</p>
-        <p>Your student account has been created. You can now log in and enroll in courses.</p>
-        <p>Regards,<br/>StudentCourses Team</p>
-        """
-
-        try:
-            # Use EmailMultiAlternatives so we can provide both plain and html
-            msg = EmailMultiAlternatives(subject, plain_message, from_email, [recipient])
-            msg.attach_alternative(html_message, "text/html")
-            # Note: keep fail_silently=True in production-like settings to avoid breaking signup flow
-            msg.send(fail_silently=True)
-            logger.info("Sent welcome email to %s", recipient)
-        except Exception as exc:
-            # Log exception; do not re-raise so registration flow stays intact
-            logger.exception("Failed to send welcome email to %s: %s", recipient, exc)
+        if _email_disabled():
+            return
+        _enqueue(send_welcome_email, instance.pk)
 
 
 @receiver(post_save, sender=AssignmentSubmission)
 def notify_student_on_graded(sender, instance, created, **kwargs):
     """
-    When an existing submission is saved and it's now graded, send an email to the student.
+    When an existing submission is saved and it's now graded, queue an email to the student.
     """
     # Only react on grading (not on initial creation)
     if not created and instance.graded:
-        recipient = getattr(instance.student.user, 'email', None)
-        if not recipient:
-            logger.info("Submission graded but student has no email: submission id %s", instance.pk)
-            return
+        queue_graded_email(instance.pk)
 
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', None) or 'no-reply@localhost'
 
-        subject = f'Your assignment for {instance.course.title} has been graded'
-        plain_message = (
-            f'Hello {instance.student.user.get_full_name() or instance.student.user.username},\n\n'
-            f'Your submission for the course \"{instance.course.title}\" was graded.\n\n'
-            f'Grade: {instance.grade}\n\n'
-            f'Feedback:\n{instance.feedback or "No feedback provided."}\n\n'
-            'Regards,\nStudentCourses'
+def instructor_flag_key(user_id):
+    """
+    Cache key for the per-user is_instructor_of_any() flag (see courses.views).
+    """
+    return f'courses:is_instructor:{user_id}'
+
+
+@receiver(pre_save, sender=Course)
+def remember_previous_instructor(sender, instance, **kwargs):
+    """
+    Record the instructor stored before this save, so a reassigned course clears the old one's flag too.
+    """
+    instance._previous_instructor_id = None
+    if instance.pk:
+        instance._previous_instructor_id = (
+            Course.objects.filter(pk=instance.pk).values_list('instructor_id', flat=True).first()
         )
 
-        html_message = f"""
-        <p>Hello <strong>{instance.student.user.get_full_name() or instance.student.user.username}</strong>,</p>
-        <p>Your submission for the course <strong>{instance.course.title}</strong> was graded.</p>
-        <p><strong>Grade:</strong> {instance.grade}</p>
-        <p><strong>Feedback:</strong><br/>{(instance.feedback or 'No feedback provided.')}</p>
-        <p>Regards,<br/>StudentCourses</p>
-        """
 
-        try:
-            msg = EmailMultiAlternatives(subject, plain_message, from_email, [recipient])
-            msg.attach_alternative(html_message, "text/html")
-            msg.send(fail_silently=True)
-            logger.info("Sent graded-notification to %s for submission %s", recipient, instance.pk)
-        except Exception as exc:
-            logger.exception("Failed to send graded-notification to %s for submission %s: %s", recipient, instance.pk, exc)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def clear_instructor_flag(sender, instance, **kwargs):
+    """
+    Drop the cached is_instructor_of_any() flag of the course's current and previous instructor.
+    With the default LocMem cache this only reaches the current process; other workers
+    pick up the change when their entry expires (INSTRUCTOR_FLAG_TTL).
+    """
+    user_ids = {instance.instructor_id, getattr(instance, '_previous_instructor_id', None)} - {None}
+    if user_ids:
+        cache.delete_many([instructor_flag_key(user_id) for user_id in user_ids])
@@ -1,3 +1,314 @@
-from django.test import TestCase
+import csv
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import signals
+from .forms import EnrollmentForm, RegistrationForm
+from .models import Course, StudentProfile, Enrollment, AssignmentSubmission
+from .views import is_instructor_of_any
+
+User = get_user_model()
+
+
+class InstructorFlagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+
+    def test_new_course_clears_cached_flag(self):
+        self.assertFalse(is_instructor_of_any(self.alice.pk))
+        Course.objects.create(title='Ethics', instructor=self.alice)
+        self.assertTrue(is_instructor_of_any(self.alice.pk))
+
+    def test_reassigned_course_clears_previous_instructor_flag(self):
+        course = Course.objects.create(title='Ethics', instructor=self.alice)
+        self.assertTrue(is_instructor_of_any(self.alice.pk))
+        self.assertFalse(is_instructor_of_any(self.bob.pk))
+        course.instructor = self.bob
+        course.save()
+        self.assertFalse(is_instructor_of_any(self.alice.pk))
+        self.assertTrue(is_instructor_of_any(self.bob.pk))
+
+    def test_deleted_course_clears_flag(self):
+        course = Course.objects.create(title='Ethics', instructor=self.alice)
+        self.assertTrue(is_instructor_of_any(self.alice.pk))
+        course.delete()
+        self.assertFalse(is_instructor_of_any(self.alice.pk))
+
+
+class EnrollManualTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user('inst', 'inst@example.com', 'pw', is_staff=True)
+        self.course = Course.objects.create(title='Algorithms', instructor=self.instructor, department='CS')
+        # the post_save signal gives every non-staff user a placeholder profile
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw').studentprofile
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw').studentprofile
+        self.client.force_login(self.instructor)
+
+    def post(self, rolls):
+        return self.client.post(reverse('courses:enroll_manual'), {'roll_number': rolls, 'course': self.course.pk})
+
+    def test_form_splits_strips_and_dedupes_rolls(self):
+        form = EnrollmentForm({'roll_number': ' B2, A1 ,,B2, ', 'course': self.course.pk})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['roll_number'], ['B2', 'A1'])
+
+    def test_form_rejects_blank_roll_list(self):
+        form = EnrollmentForm({'roll_number': ' , ', 'course': self.course.pk})
+        self.assertFalse(form.is_valid())
+        self.assertIn('roll_number', form.errors)
+
+    def test_enrolls_several_students_at_once(self):
+        response = self.post(f'{self.alice.roll_number}, {self.bob.roll_number}')
+        self.assertRedirects(response, reverse('courses:list'))
+        self.assertEqual(
+            set(Enrollment.objects.filter(course=self.course, active=True).values_list('student', flat=True)),
+            {self.alice.pk, self.bob.pk},
+        )
+
+    def test_unknown_rolls_are_reported_but_known_ones_enrolled(self):
+        response = self.post(f'{self.alice.roll_number},NOPE')
+        self.assertRedirects(response, reverse('courses:list'))
+        self.assertTrue(Enrollment.objects.filter(student=self.alice, course=self.course).exists())
+        texts = [m.message for m in get_messages(response.wsgi_request)]
+        self.assertIn('No student found with roll number NOPE.', texts)
+
+    def test_all_unknown_rolls_enroll_nobody(self):
+        response = self.post('NOPE, ALSO-NOPE')
+        self.assertRedirects(response, reverse('courses:enroll_manual'))
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_existing_enrollment_is_left_untouched(self):
+        Enrollment.objects.create(student=self.alice, course=self.course, active=False, grade='B')
+        self.post(f'{self.alice.roll_number},{self.bob.roll_number}')
+        alice_enrollment = Enrollment.objects.get(student=self.alice, course=self.course)
+        self.assertFalse(alice_enrollment.active)
+        self.assertEqual(alice_enrollment.grade, 'B')
+        self.assertTrue(Enrollment.objects.get(student=self.bob, course=self.course).active)
+
+    def test_message_counts_new_and_existing_enrollments_separately(self):
+        Enrollment.objects.create(student=self.alice, course=self.course, active=False)
+        response = self.post(f'{self.alice.roll_number},{self.bob.roll_number}')
+        texts = [m.message for m in get_messages(response.wsgi_request)]
+        self.assertIn('1 student(s) enrolled in Algorithms, 1 already had an enrollment.', texts)
+
+    def test_message_without_existing_enrollments(self):
+        response = self.post(f'{self.alice.roll_number},{self.bob.roll_number}')
+        texts = [m.message for m in get_messages(response.wsgi_request)]
+        self.assertIn('2 student(s) enrolled in Algorithms.', texts)
+
+
+class SubmissionListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        profile = self.user.studentprofile
+        course = Course.objects.create(title='Algorithms')
+        base = timezone.now()
+        # 45 rows over only 3 distinct timestamps, so page boundaries fall inside runs of ties
+        AssignmentSubmission.objects.bulk_create([
+            AssignmentSubmission(student=profile, course=course, file='assignments/a.pdf',
+                                 submitted_at=base - timedelta(hours=i % 3))
+            for i in range(45)
+        ])
+        self.expected = list(
+            AssignmentSubmission.objects.order_by('-submitted_at', '-pk').values_list('pk', flat=True)
+        )
+        self.client.force_login(self.user)
+
+    def get(self, **params):
+        return self.client.get(reverse('courses:submissions_list') + '?' + urlencode(params))
+
+    def page_pks(self, response):
+        return [s.pk for s in response.context['submissions']]
+
+    def test_older_then_newer_pages_cover_tied_rows_exactly_once(self):
+        pages = []
+        response = self.get()
+        while True:
+            pages.append(self.page_pks(response))
+            cursor = response.context['older_cursor']
+            if cursor is None:
+                break
+            response = self.get(before=cursor[0], before_id=cursor[1])
+        self.assertEqual([len(p) for p in pages], [20, 20, 5])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        # and back again towards the newest rows
+        for expected_page in reversed(pages[:-1]):
+            cursor = response.context['newer_cursor']
+            response = self.get(after=cursor[0], after_id=cursor[1])
+            self.assertEqual(self.page_pks(response), expected_page)
+        self.assertIsNone(response.context['newer_cursor'])
+
+    def test_bad_cursors_fall_back_to_first_page(self):
+        for params in (
+            {'before': '2024-02-30T00:00:00', 'before_id': '1'},
+            {'before': 'garbage', 'before_id': '1'},
+            {'before': timezone.now().isoformat(), 'before_id': 'abc'},
+            {'before': timezone.now().isoformat()},
+            {'before': timezone.now().isoformat(), 'before_id': '9' * 30},
+            {'after': '2024-13-01T00:00:00', 'after_id': '1'},
+            {'page': '2'},
+        ):
+            with self.subTest(params=params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.page_pks(response), self.expected[:20])
+
+    def test_cursor_past_either_end_offers_way_back_to_newest(self):
+        oldest = timezone.now() - timedelta(days=365)
+        newest = timezone.now() + timedelta(days=365)
+        for params in (
+            {'before': oldest.isoformat(), 'before_id': '1'},
+            {'after': newest.isoformat(), 'after_id': '1'},
+        ):
+            with self.subTest(params=params):
+                response = self.get(**params)
+                self.assertEqual(self.page_pks(response), [])
+                self.assertTrue(response.context['show_newest'])
+                self.assertContains(response, 'Back to the newest submissions')
+
+    def test_first_page_has_no_newest_link(self):
+        response = self.get()
+        self.assertFalse(response.context['show_newest'])
+        self.assertIsNone(response.context['newer_cursor'])
+
+
+class RegistrationTests(TestCase):
+    password = 'Xyzzy-12345!'
+
+    def register(self, username, **extra):
+        data = {'username': username, 'email': f'{username}@example.com',
+                'password1': self.password, 'password2': self.password}
+        data.update(extra)
+        return self.client.post(reverse('register'), data)
+
+    def test_typed_roll_number_is_kept(self):
+        response = self.register('alice', roll_number='CS-001')
+        self.assertRedirects(response, reverse('login'))
+        self.assertEqual(User.objects.get(username='alice').studentprofile.roll_number, 'CS-001')
+
+    def test_student_without_roll_gets_placeholder(self):
+        self.register('alice')
+        user = User.objects.get(username='alice')
+        self.assertEqual(user.studentprofile.roll_number, f'ROLL{user.pk:05d}')
+
+    def test_placeholder_shaped_roll_is_rejected(self):
+        for roll in ('ROLL00002', 'roll00002', 'ROLL123456'):
+            with self.subTest(roll=roll):
+                response = self.register('alice', roll_number=roll)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('roll_number', response.context['form'].errors)
+                self.assertFalse(User.objects.filter(username='alice').exists())
+
+    def test_placeholder_cannot_collide_with_typed_roll(self):
+        # a would-be squatter on the next user's placeholder is stopped at validation...
+        self.register('alice', roll_number=f'ROLL{1:05d}')
+        # ...so the next student's placeholder profile is created without an IntegrityError
+        response = self.register('bob')
+        self.assertRedirects(response, reverse('login'))
+        self.assertTrue(StudentProfile.objects.filter(user__username='bob').exists())
+
+    def test_duplicate_roll_is_rejected_for_students(self):
+        self.register('alice', roll_number='CS-001')
+        response = self.register('bob', roll_number='CS-001')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('roll_number', response.context['form'].errors)
+        self.assertFalse(User.objects.filter(username='bob').exists())
+
+    def test_instructor_roll_number_is_not_validated(self):
+        self.register('alice', roll_number='CS-001')
+        for roll in ('CS-001', 'ROLL00002'):
+            with self.subTest(roll=roll):
+                form = RegistrationForm({
+                    'username': f'inst{roll}', 'email': 'inst@example.com',
+                    'password1': self.password, 'password2': self.password,
+                    'is_instructor': 'on', 'roll_number': roll,
+                })
+                self.assertTrue(form.is_valid(), form.errors)
+                user = form.save()
+                self.assertTrue(user.is_staff)
+                self.assertFalse(StudentProfile.objects.filter(user=user).exists())
+
+
+@override_settings(DEBUG=False, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class GradeSubmissionTests(TestCase):
+    def setUp(self):
+        # run queued emails inline instead of on a daemon thread
+        patcher = mock.patch.object(signals, '_run_in_background', lambda func, *args: func(*args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.instructor = User.objects.create_user('inst', 'inst@example.com', 'pw', is_staff=True)
+        student = User.objects.create_user('alice', 'alice@example.com', 'pw').studentprofile
+        course = Course.objects.create(title='Algorithms', instructor=self.instructor)
+        self.submission = AssignmentSubmission.objects.create(student=student, course=course, file='assignments/a.pdf')
+        mail.outbox.clear()
+        self.client.force_login(self.instructor)
+
+    def test_grading_updates_row_and_emails_student_once(self):
+        before = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('courses:grade_submission', args=[self.submission.pk]),
+                {'grade': 'A', 'feedback': 'Well done'},
+            )
+        self.assertRedirects(response, reverse('courses:submission_detail', args=[self.submission.pk]))
+
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.grade, 'A')
+        self.assertEqual(self.submission.feedback, 'Well done')
+        self.assertTrue(self.submission.graded)
+        self.assertEqual(self.submission.graded_by, self.instructor)
+        self.assertGreaterEqual(self.submission.graded_at, before)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+        self.assertIn('Algorithms', mail.outbox[0].subject)
+
+
+class SubmissionAdminExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        self.instructor = User.objects.create_user('inst', 'inst@example.com', 'pw', is_staff=True)
+        student = User.objects.create_user('alice', 'alice@example.com', 'pw').studentprofile
+        course = Course.objects.create(title='Algorithms', instructor=self.instructor)
+        self.graded = AssignmentSubmission.objects.create(
+            student=student, course=course, file='assignments/a.pdf',
+            graded=True, grade='A', graded_by=self.instructor, graded_at=timezone.now(),
+        )
+        self.ungraded = AssignmentSubmission.objects.create(student=student, course=course, file='assignments/b.pdf')
+        # not selected, so it must not show up in the export
+        AssignmentSubmission.objects.create(student=student, course=course, file='assignments/c.pdf')
+        self.client.force_login(self.admin)
+
+    def test_export_streams_one_row_per_selected_submission(self):
+        response = self.client.post(reverse('admin:courses_assignmentsubmission_changelist'), {
+            'action': 'export_as_csv',
+            '_selected_action': [self.graded.pk, self.ungraded.pk],
+        })
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        body = b''.join(response.streaming_content).decode()
+        rows = list(csv.reader(body.splitlines()))
+
+        self.assertEqual(rows[0], ['id', 'roll_number', 'username', 'course', 'submitted_at', 'graded', 'grade', 'graded_by', 'graded_at'])
+        by_id = {int(row[0]): row for row in rows[1:]}
+        self.assertEqual(set(by_id), {self.graded.pk, self.ungraded.pk})
+
+        graded = by_id[self.graded.pk]
+        self.assertEqual(graded[1:4], [self.graded.student.roll_number, 'alice', 'Algorithms'])
+        self.assertEqual(graded[5:8], ['True', 'A', 'inst'])
+        self.assertTrue(graded[8])
+
+        # no grader: the graded_by/graded_at columns come out empty
+        self.assertEqual(by_id[self.ungraded.pk][5:], ['False', '', '', ''])
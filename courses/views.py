@@ -1,9 +1,15 @@
 # courses/views.py
 import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.views.generic import ListView, DetailView, CreateView
@@ -18,9 +24,53 @@ from .forms import (
     RegistrationForm,
     CourseForm,
 )
+from .signals import instructor_flag_key, queue_graded_email
 
 logger = logging.getLogger(__name__)
 
+# how long a "teaches any course" flag may be stale in processes that didn't save the course
+INSTRUCTOR_FLAG_TTL = 60  # seconds
+
+
+# ---------------- Helpers ----------------
+def get_student_profile(request):
+    """
+    Return the StudentProfile of request.user (or None), memoized on the request so
+    repeated lookups within one request -- including a missing profile -- cost a single query.
+    """
+    if not hasattr(request, '_student_profile'):
+        profile = None
+        if request.user.is_authenticated:
+            try:
+                profile = request.user.studentprofile
+            except StudentProfile.DoesNotExist:
+                pass
+        request._student_profile = profile
+    return request._student_profile
+
+
+def is_instructor_of_any(user_id):
+    """
+    Whether the user teaches at least one course, cached for INSTRUCTOR_FLAG_TTL seconds.
+    courses.signals drops the entry when a course changes, but with the default per-process
+    LocMem cache that only affects the saving process -- other workers may lag by up to the TTL.
+    """
+    key = instructor_flag_key(user_id)
+    flag = cache.get(key)
+    if flag is None:
+        flag = Course.objects.filter(instructor_id=user_id).exists()
+        cache.set(key, flag, INSTRUCTOR_FLAG_TTL)
+    return flag
+
+
+def _course_row_count(model):
+    """
+    Correlated COUNT(*) of `model` rows pointing at the outer Course, as a subquery.
+    Unlike two Count() joins, this doesn't multiply enrollments by submissions.
+    """
+    counts = model.objects.filter(course=OuterRef('pk')).order_by().values('course').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts), 0)
+
 
 # ---------------- Assignment upload ----------------
 class AssignmentCreateView(LoginRequiredMixin, CreateView):
@@ -41,14 +91,14 @@ class AssignmentCreateView(LoginRequiredMixin, CreateView):
         ctx = super().get_context_data(**kwargs)
         form = ctx.get('form') or self.get_form()
         qs = form.fields['course'].queryset
-        ctx['no_courses'] = (qs is None) or (hasattr(qs, 'count') and qs.count() == 0)
+        # exists() is a LIMIT 1 probe; we only need to know whether there is any course
+        ctx['no_courses'] = (qs is None) or not qs.exists()
         return ctx
 
     def form_valid(self, form):
         # ensure studentprofile exists
-        try:
-            profile = self.request.user.studentprofile
-        except StudentProfile.DoesNotExist:
+        profile = get_student_profile(self.request)
+        if profile is None:
             messages.error(self.request, "Student profile missing. Contact admin.")
             return redirect('courses:list')
 
@@ -59,8 +109,7 @@ class AssignmentCreateView(LoginRequiredMixin, CreateView):
             return redirect('courses:upload_assignment')
 
         if not (self.request.user.is_staff or self.request.user.is_superuser):
-            enrolled_course_ids = list(profile.enrollments.filter(active=True).values_list('course_id', flat=True))
-            if selected_course.id not in enrolled_course_ids:
+            if not profile.enrollments.filter(active=True, course=selected_course).exists():
                 messages.error(self.request, "Selected course is not in your active enrollments.")
                 return redirect('courses:list')
 
@@ -118,7 +167,9 @@ class CourseListView(ListView):
     paginate_by = 4
 
     def get_queryset(self):
-        qs = super().get_queryset().select_related('instructor')
+        qs = super().get_queryset().select_related('instructor').annotate(
+            active_enrollments=Count('enrollments', filter=Q(enrollments__active=True))
+        )
         dept = self.request.GET.get('department')
         if dept:
             qs = qs.filter(department__iexact=dept)
@@ -130,32 +181,37 @@ class CourseDetailView(DetailView):
     template_name = 'courses/course_detail.html'
     context_object_name = 'course'
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
+    def get_queryset(self):
+        # the course stats are annotated too, so the whole page comes from one SELECT
+        qs = super().get_queryset().select_related('instructor').annotate(
+            enrollments_count=_course_row_count(Enrollment),
+            submissions_count=_course_row_count(AssignmentSubmission),
+        )
         user = self.request.user
-        is_enrolled = False
         if user.is_authenticated:
-            try:
-                profile = user.studentprofile
-            except StudentProfile.DoesNotExist:
-                profile = None
-            if profile:
-                is_enrolled = Enrollment.objects.filter(student=profile, course=self.object, active=True).exists()
-        ctx['is_enrolled'] = is_enrolled
+            # fold the enrollment check into the object fetch as an EXISTS subquery
+            qs = qs.annotate(is_enrolled_flag=Exists(
+                Enrollment.objects.filter(course=OuterRef('pk'), student__user=user, active=True)
+            ))
+        return qs
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['is_enrolled'] = getattr(self.object, 'is_enrolled_flag', False)
         return ctx
 
 
 # ---------------- Enroll toggle (POST-only) ----------------
 @login_required
 @require_POST
+@transaction.atomic
 def enroll_toggle(request, pk):
     if request.user.is_staff and not request.user.is_superuser:
         messages.error(request, "Instructor/staff accounts cannot enroll as students.")
         return redirect('courses:detail', pk=pk)
 
-    try:
-        profile = request.user.studentprofile
-    except StudentProfile.DoesNotExist:
+    profile = get_student_profile(request)
+    if profile is None:
         messages.error(request, "Student profile not found. Contact admin.")
         return redirect('courses:detail', pk=pk)
 
@@ -167,12 +223,14 @@ def enroll_toggle(request, pk):
         messages.success(request, f"You have been enrolled in '{course.title}'.")
         logger.info("User %s enrolled in course %s", request.user, course.pk)
     else:
-        # toggle active
+        # toggle active; re-enrolling also resets enrolled_on, in a single UPDATE
         enrollment.active = not enrollment.active
-        enrollment.save(update_fields=['active'])
+        update_fields = ['active']
         if enrollment.active:
             enrollment.enrolled_on = timezone.now()
-            enrollment.save(update_fields=['enrolled_on'])
+            update_fields.append('enrolled_on')
+        enrollment.save(update_fields=update_fields)
+        if enrollment.active:
             messages.success(request, f"You have been re-enrolled in '{course.title}'.")
             logger.info("User %s re-enrolled in course %s", request.user, course.pk)
         else:
@@ -191,7 +249,15 @@ class SubmissionListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         user = self.request.user
-        qs = AssignmentSubmission.objects.select_related('student__user', 'course', 'graded_by').order_by('-submitted_at')
+        # only() trims the joined rows down to the columns the list template renders;
+        # `file` is deliberately left deferred -- the list links to the detail page, never to file.url
+        qs = AssignmentSubmission.objects.select_related('student__user', 'course', 'graded_by').only(
+            'id', 'submitted_at', 'graded', 'grade',
+            'course__id', 'course__title', 'course__instructor',
+            'student__id', 'student__roll_number',
+            'student__user__username', 'student__user__first_name', 'student__user__last_name', 'student__user__email',
+            'graded_by__username',
+        ).order_by('-submitted_at', '-pk')
 
         course_id = self.request.GET.get('course')
 
@@ -200,53 +266,122 @@ class SubmissionListView(LoginRequiredMixin, ListView):
             return qs.filter(course_id=course_id) if course_id else qs
 
         # Instructor: courses where Course.instructor == user (non-staff instructor)
-        instr_qs = Course.objects.filter(instructor=user)
-        if instr_qs.exists():
+        # kept on the view so get_context_data() doesn't repeat the lookup
+        self._instr_qs = Course.objects.filter(instructor=user)
+        self._is_instructor = is_instructor_of_any(user.pk)
+        if self._is_instructor:
             if course_id:
-                return qs.filter(course_id=course_id, course__in=instr_qs)
-            return qs.filter(course__in=instr_qs)
+                return qs.filter(course_id=course_id, course__in=self._instr_qs)
+            return qs.filter(course__in=self._instr_qs)
 
         # Student: only their own submissions
-        try:
-            profile = user.studentprofile
-        except StudentProfile.DoesNotExist:
+        profile = get_student_profile(self.request)
+        if profile is None:
             return AssignmentSubmission.objects.none()
 
         if course_id:
             return qs.filter(student=profile, course_id=course_id)
         return qs.filter(student=profile)
 
+    def _get_cursor(self, name):
+        """
+        Read a (submitted_at, pk) cursor from ?<name>=<iso timestamp>&<name>_id=<pk>.
+        Anything malformed (unparseable or impossible dates, non-numeric ids) counts as no cursor.
+        """
+        try:
+            stamp = parse_datetime(self.request.GET.get(name) or '')
+            pk = int(self.request.GET.get(f'{name}_id') or '')
+        except ValueError:
+            return None
+        if stamp is None or not 0 < pk < 2 ** 63:
+            return None
+        if timezone.is_naive(stamp):
+            stamp = timezone.make_aware(stamp)
+        return stamp, pk
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Keyset pagination on (submitted_at, pk), newest first, so deep pages cost the same as the
+        first one (no OFFSET scan). ?before=... pages towards older rows, ?after=... back towards
+        newer ones; without a valid cursor the newest page is shown (legacy ?page=N is ignored).
+        """
+        before = self._get_cursor('before')
+        after = None if before else self._get_cursor('after')
+
+        # the redundant submitted_at__lte/__gte bound lets the DB seek into the
+        # (-submitted_at, -id) index instead of walking it from the top
+        def older_than(cursor, inclusive=False):
+            stamp, pk = cursor
+            pk_cmp = 'pk__lte' if inclusive else 'pk__lt'
+            return Q(submitted_at__lte=stamp) & (Q(submitted_at__lt=stamp) | Q(submitted_at=stamp, **{pk_cmp: pk}))
+
+        def newer_than(cursor, inclusive=False):
+            stamp, pk = cursor
+            pk_cmp = 'pk__gte' if inclusive else 'pk__gt'
+            return Q(submitted_at__gte=stamp) & (Q(submitted_at__gt=stamp) | Q(submitted_at=stamp, **{pk_cmp: pk}))
+
+        # fetch one extra row to learn whether another page exists in the paging direction
+        if after:
+            rows = list(queryset.filter(newer_than(after)).reverse()[:page_size + 1])
+            has_newer = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+            has_older = queryset.filter(older_than(after, inclusive=True)).exists()
+        else:
+            if before:
+                queryset_page = queryset.filter(older_than(before))
+                has_newer = queryset.filter(newer_than(before, inclusive=True)).exists()
+            else:
+                queryset_page = queryset
+                has_newer = False
+            rows = list(queryset_page[:page_size + 1])
+            has_older = len(rows) > page_size
+            rows = rows[:page_size]
+
+        self.older_cursor = (rows[-1].submitted_at.isoformat(), rows[-1].pk) if rows and has_older else None
+        self.newer_cursor = (rows[0].submitted_at.isoformat(), rows[0].pk) if rows and has_newer else None
+        # a stale cursor can land on an empty page; as long as other rows exist, offer a way back
+        self.show_newest = has_newer or (not rows and has_older)
+        return None, None, rows, bool(self.older_cursor or self.newer_cursor or self.show_newest)
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         user = self.request.user
 
         # Debug info for staff/instructors/superuser
-        if user.is_superuser or user.is_staff or Course.objects.filter(instructor=user).exists():
-            instr_qs = Course.objects.filter(instructor=user) if not (user.is_superuser or user.is_staff) else Course.objects.all()
-            instructor_courses = []
-            for c in instr_qs:
-                instructor_courses.append({
-                    'id': c.id,
-                    'title': c.title,
-                    'submissions_count': AssignmentSubmission.objects.filter(course=c).count()
-                })
-            ctx['debug_instructor_courses'] = instructor_courses
+        is_staff = user.is_superuser or user.is_staff
+        if is_staff or getattr(self, '_is_instructor', False):
+            instr_qs = Course.objects.all() if is_staff else self._instr_qs
+            # one GROUP BY query instead of a COUNT per course
+            instr_qs = instr_qs.annotate(submissions_count=Count('submissions'))
+            ctx['debug_instructor_courses'] = list(instr_qs.values('id', 'title', 'submissions_count'))
             ctx['debug_course_param'] = self.request.GET.get('course')
-            ctx['debug_total_submissions'] = AssignmentSubmission.objects.count()
+            # the site-wide total costs an extra COUNT(*), so only run it in DEBUG
+            ctx['debug_total_submissions'] = AssignmentSubmission.objects.count() if settings.DEBUG else None
+        ctx['older_cursor'] = getattr(self, 'older_cursor', None)
+        ctx['newer_cursor'] = getattr(self, 'newer_cursor', None)
+        ctx['show_newest'] = getattr(self, 'show_newest', False)
         return ctx
 
 
 class SubmissionDetailView(LoginRequiredMixin, DetailView):
     model = AssignmentSubmission
+    queryset = AssignmentSubmission.objects.select_related('student__user', 'course__instructor', 'graded_by')
     template_name = 'courses/submission_detail.html'
     context_object_name = 'submission'
 
+    def get_object(self, queryset=None):
+        # dispatch() and get() both ask for the object; fetch it only once
+        if not hasattr(self, '_obj'):
+            self._obj = super().get_object(queryset)
+        return self._obj
+
     def dispatch(self, request, *args, **kwargs):
         self.object = self.get_object()
         user = request.user
 
         # Student owner?
-        is_owner = hasattr(user, 'studentprofile') and (self.object.student == getattr(user, 'studentprofile', None))
+        profile = get_student_profile(request)
+        is_owner = profile is not None and self.object.student_id == profile.pk
         # Course instructor?
         is_course_instructor = (self.object.course.instructor_id == user.id)
         # Staff or superuser may view
@@ -300,15 +435,32 @@ def enroll_manual(request):
     if request.method == 'POST':
         form = EnrollmentForm(request.POST)
         if form.is_valid():
-            roll = form.cleaned_data['roll_number']
+            rolls = form.cleaned_data['roll_number']
             course = form.cleaned_data['course']
-            try:
-                profile = StudentProfile.objects.get(roll_number=roll)
-            except StudentProfile.DoesNotExist:
-                messages.error(request, f"No student found with roll number {roll}.")
+            # one SELECT for all profiles + one INSERT for all enrollments, whatever the number of rolls
+            profiles = StudentProfile.objects.in_bulk(rolls, field_name='roll_number')
+            if not profiles:
+                messages.error(request, f"No student found with roll number {', '.join(rolls)}.")
                 return redirect('courses:enroll_manual')
-            Enrollment.objects.get_or_create(student=profile, course=course, defaults={'active': True})
-            messages.success(request, f"{profile} enrolled in {course}.")
+            missing = [r for r in rolls if r not in profiles]
+            if missing:
+                messages.warning(request, f"No student found with roll number {', '.join(missing)}.")
+            # existing (student, course) rows are left untouched, as get_or_create did;
+            # look them up first so the message only counts students actually enrolled now
+            already = set(
+                Enrollment.objects.filter(course=course, student__in=profiles.values())
+                .values_list('student_id', flat=True)
+            )
+            new_profiles = [p for p in profiles.values() if p.pk not in already]
+            Enrollment.objects.bulk_create(
+                [Enrollment(student=p, course=course, active=True) for p in new_profiles],
+                ignore_conflicts=True,
+            )
+            summary = f"{len(new_profiles)} student(s) enrolled in {course}"
+            if already:
+                summary += f", {len(already)} already had an enrollment"
+            messages.success(request, f"{summary}.")
+            logger.info("Manual enrollment of rolls %s in course %s by %s", [p.roll_number for p in new_profiles], course.pk, request.user)
             return redirect('courses:list')
     else:
         form = EnrollmentForm()
@@ -318,20 +470,19 @@ def enroll_manual(request):
 # ---------------- My enrollments ----------------
 @login_required
 def my_enrollments(request):
-    try:
-        profile = request.user.studentprofile
-    except StudentProfile.DoesNotExist:
+    profile = get_student_profile(request)
+    if profile is None:
         messages.error(request, "You don't have a student profile.")
         return redirect('courses:list')
 
-    enrollments = profile.enrollments.select_related('course')
+    enrollments = profile.enrollments.select_related('course', 'course__instructor')
     return render(request, 'courses/my_enrollments.html', {'enrollments': enrollments})
 
 
 # ---------------- Grading ----------------
 @login_required
 def grade_submission(request, pk):
-    submission = get_object_or_404(AssignmentSubmission, pk=pk)
+    submission = get_object_or_404(AssignmentSubmission.objects.select_related('student__user', 'course'), pk=pk)
 
     # Only course instructor, staff, or superuser can grade
     if not (request.user.is_superuser or request.user.is_staff or submission.course.instructor_id == request.user.id):
@@ -341,12 +492,15 @@ def grade_submission(request, pk):
     if request.method == 'POST':
         grade = request.POST.get('grade')
         feedback = request.POST.get('feedback', '')
-        submission.grade = grade
-        submission.feedback = feedback
-        submission.graded = True
-        submission.graded_by = request.user
-        submission.graded_at = timezone.now()
-        submission.save()
+        # one UPDATE of the grading columns; post_save doesn't fire, so queue the email ourselves
+        AssignmentSubmission.objects.filter(pk=submission.pk).update(
+            grade=grade,
+            feedback=feedback,
+            graded=True,
+            graded_by=request.user,
+            graded_at=timezone.now(),
+        )
+        queue_graded_email(submission.pk)
         messages.success(request, 'Submission graded and student notified (if email configured).')
         logger.info("Submission %s graded by %s (grade=%s)", submission.pk, request.user, grade)
         return redirect('courses:submission_detail', pk=submission.pk)